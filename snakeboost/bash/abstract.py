@@ -3,9 +3,11 @@ from __future__ import absolute_import
 
 
 class ShStatement:
+    __slots__ = ()
+
     def to_str(self):
         return str(self)
 
 
 class ShCmd(ShStatement):
-    pass
+    __slots__ = ()
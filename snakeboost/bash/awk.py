@@ -29,6 +29,7 @@ class AwkBlock:
 
 
 class awk(ShSingleCmd):
+    __slots__ = ()
     cmd = "awk"
 
     def __init__(self, *expr: str):
@@ -1,7 +1,6 @@
 # pylint: disable=missing-class-docstring, invalid-name
 from __future__ import absolute_import
 
-from collections import UserList
 from typing import Union
 
 from snakeboost.bash.abstract import ShCmd
@@ -9,6 +8,7 @@ from snakeboost.bash.statement import StringLike
 
 
 class ShSingleCmd(ShCmd):
+    __slots__ = ("expr", "flags", "args")
     cmd: str
 
     def __init__(self, expr: StringLike = ""):
@@ -28,6 +28,8 @@ class ShSingleCmd(ShCmd):
 
 
 class find(ShSingleCmd):
+    __slots__ = ("root",)
+
     def __init__(self, root: StringLike, expr: str = ""):
         self.root = root
         super().__init__(expr)
@@ -40,6 +42,7 @@ class find(ShSingleCmd):
 
 
 class wc(ShSingleCmd):
+    __slots__ = ()
     cmd = "wc"
 
     def l(self):  # noqa: E741, E743
@@ -48,6 +51,7 @@ class wc(ShSingleCmd):
 
 
 class echo(ShSingleCmd):
+    __slots__ = ()
     cmd = "echo"
 
     def __init__(self, expr: StringLike):
@@ -63,6 +67,7 @@ class echo(ShSingleCmd):
 
 
 class mkdir(ShSingleCmd):
+    __slots__ = ()
     cmd = "mkdir"
 
     @property
@@ -72,6 +77,7 @@ class mkdir(ShSingleCmd):
 
 
 class mv(ShSingleCmd):
+    __slots__ = ()
     cmd = "mv"
 
     def __init__(self, _from: StringLike, _to: StringLike):
@@ -79,6 +85,7 @@ class mv(ShSingleCmd):
 
 
 class ls(ShSingleCmd):
+    __slots__ = ()
     cmd = "ls"
 
     @property
@@ -88,17 +95,20 @@ class ls(ShSingleCmd):
 
 
 class cat(ShSingleCmd):
+    __slots__ = ()
     cmd = "cat"
 
     def __init__(self, item: StringLike = None):
         super().__init__(item or "")
 
 
-class ShPipe(UserList, ShCmd):
+class ShPipe(list, ShCmd):
+    __slots__ = ()
+
     def __or__(self, other: Union[ShCmd, str]):
         if isinstance(other, ShPipe):
-            return self.__class__([*self.data, *other])
-        return self.__class__([*self.data, other])
+            return self.__class__([*self, *other])
+        return self.__class__([*self, other])
 
     def __str__(self):
-        return " | ".join(str(data) for data in self.data)
+        return " | ".join(str(cmd) for cmd in self)
@@ -1,11 +1,12 @@
 # pylint: disable=missing-class-docstring, invalid-name
 from __future__ import absolute_import
 
+import functools as ft
 import itertools as it
 import textwrap
 from pathlib import Path
 from string import ascii_lowercase
-from typing import Iterable, Optional, Tuple, Union
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
 from snakeboost.bash.abstract import ShCmd, ShStatement
 from snakeboost.bash.globals import Globals
@@ -22,6 +23,7 @@ def _var_names(prefix=""):
 
 
 class ShVar:
+    __slots__ = ("name", "value", "export")
     name_generator = _var_names(prefix="__sb_")
     active_names = set()
 
@@ -91,21 +93,51 @@ def canonicalize(entities: Iterable[ShEntity]):
 
 
 class ShBlock(ShStatement):
+    __slots__ = ("statements", "wrap", "_cached")
+
     def __init__(self, *args: ShEntity, wrap: bool = True):
         self.statements = list(canonicalize(args))
         self.wrap = wrap
+        # Blocks are not modified after construction, so each is rendered at most
+        # once per debug setting
+        self._cached: Dict[bool, str] = {}
 
     def __str__(self):
-        if Globals.DEBUG:
-            sep = "\n"
-            wrap = lambda s: f"(\n{textwrap.indent(s, '    ')}\n)"  # noqa: E731
-        else:
-            sep = "; "
-            wrap = lambda s: f"( {s} )"  # noqa: E731
+        debug = Globals.DEBUG
+        cached = self._cached.get(debug)
+        if cached is None:
+            if debug:
+                cached = self._render_debug()
+            else:
+                buffer: List[str] = []
+                self._render(buffer)
+                cached = "".join(buffer)
+            self._cached[debug] = cached
+        return cached
+
+    def _render(self, out: List[str]):
+        # Nested blocks write into the same buffer, rather than each building and
+        # returning its own string
+        if self.wrap:
+            out.append("( ")
+        for i, statement in enumerate(self.statements):
+            if i:
+                out.append("; ")
+            if isinstance(statement, ShBlock):
+                cached = statement._cached.get(False)
+                if cached is None:
+                    statement._render(out)
+                else:
+                    out.append(cached)
+            else:
+                out.append(str(statement))
+        if self.wrap:
+            out.append(" )")
 
-        body = sep.join(str(statement) for statement in self.statements)
+    def _render_debug(self):
+        body = "\n".join(str(statement) for statement in self.statements)
         if self.wrap:
-            return wrap(body)
+            return f"(\n{textwrap.indent(body, '    ')}\n)"
         return body
 
 
@@ -116,25 +148,29 @@ def _block_args(cmd: Tuple[ShEntity]):
 
 
 class ShIfBody(ShStatement):
-    def __init__(self, preamble: str, cmds: Tuple[ShEntity]):
+    def __init__(
+        self, preamble: str, cmds: Tuple[ShEntity], parts: Tuple[str, ...] = ()
+    ):
         body = _block_args(cmds)
         if Globals.DEBUG:
             statement = f"\n{textwrap.indent(body, '    ')}"
         else:
             statement = " " + body
-        self.expr = f"{preamble}{statement}"
+        # Branches are kept as fragments and joined once in __str__, so long
+        # elif/else chains don't recopy the whole statement on every branch
+        self._parts = (*parts, preamble, statement)
 
     def __str__(self):
         if Globals.DEBUG:
             closer = "\nfi"
         else:
             closer = "; fi"
-        return f"{self.expr}{closer}"
+        return "".join((*self._parts, closer))
 
     def els(self, *cmd: ShEntity):
         if Globals.DEBUG:
-            return self.__class__(f"{self.expr}\nelse", cmd)
-        return self.__class__(f"{self.expr}; else", cmd)
+            return self.__class__("\nelse", cmd, self._parts)
+        return self.__class__("; else", cmd, self._parts)
 
     def __rshift__(self, cmd: ShEntity):
         if isinstance(cmd, tuple):
@@ -143,6 +179,8 @@ class ShIfBody(ShStatement):
 
 
 class ShIf:
+    __slots__ = ("expr",)
+
     def __init__(self, expr: Union[StringLike, ShCmd] = ""):
         self.expr = self._eval_expr(expr)
 
@@ -185,6 +223,7 @@ class ShIf:
         return ShIfNot
 
     @classmethod
+    @ft.lru_cache(maxsize=256)
     def e(cls, expr: StringLike):
         return cls(f"-e {expr}")
 
@@ -193,6 +232,7 @@ class ShIf:
         return cls.e(expr)
 
     @classmethod
+    @ft.lru_cache(maxsize=256)
     def d(cls, expr: StringLike):
         return cls(f"-d {expr}")
 
@@ -201,6 +241,7 @@ class ShIf:
         return cls.d(expr)
 
     @classmethod
+    @ft.lru_cache(maxsize=256)
     def h(cls, expr: StringLike):
         return cls(f"-h {expr}")
 
@@ -234,6 +275,8 @@ class ShIf:
 
 
 class ShIfNot(ShIf):
+    __slots__ = ()
+
     def __init__(self, expr: Union[StringLike, ShCmd] = ""):
         if isinstance(expr, ShCmd):
             expr = subsh(expr)
@@ -1,5 +1,8 @@
 from __future__ import absolute_import
 
+import functools as ft
 
+
+@ft.lru_cache(maxsize=1024)
 def quote_escape(text: str):
     return text.replace("'", "'\"'\"'")
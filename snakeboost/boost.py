@@ -33,6 +33,32 @@ class _TestLogger:
     stream_handler = Handler()
 
 
+# Regex adapted from ansi-regex npm package
+# https://www.npmjs.com/package/ansi-regex
+_ANSI_REGEX = r"""
+    (?:
+        [\u001B\u009B][\[\]()\#;?]*
+        (?:
+            (?:
+                (?:
+                    (?:;[-a-zA-Z\d\/\#&.:=?%@~_]+)* |
+                    [a-zA-Z\d]+ (?:;[-a-zA-Z\d\/\#&.:=?%@~_]*)*
+                )?
+                \u0007
+            ) |
+            (?:
+                (?:\d{1,4}(?:;\d{0,4})*)?
+                [\dA-PR-TZcf-nq-uy=><~]
+
+            )
+        )
+    )
+"""
+# Matches a pair of braces separated only by ansi codes. Compiled once at import, as
+# colorize_cmd runs for every enhanced rule
+_BRACE_PAIR = re.compile(rf"([\{{\}}]){_ANSI_REGEX}+\1", re.VERBOSE)
+
+
 # pylint: disable=invalid-name
 @attr.frozen
 class _ANSI:
@@ -86,32 +112,9 @@ class _ANSI:
         ]
         merged = "".join(_quote_variables(zip(escaped_literals, fields), context=[0]))
 
-        # Regex adapted from ansi-regex npm package
-        # https://www.npmjs.com/package/ansi-regex
-        ansi_regex = r"""
-            (?:
-                [\u001B\u009B][\[\]()\#;?]*
-                (?:
-                    (?:
-                        (?:
-                            (?:;[-a-zA-Z\d\/\#&.:=?%@~_]+)* |
-                            [a-zA-Z\d]+ (?:;[-a-zA-Z\d\/\#&.:=?%@~_]*)*
-                        )?
-                        \u0007
-                    ) |
-                    (?:
-                        (?:\d{1,4}(?:;\d{0,4})*)?
-                        [\dA-PR-TZcf-nq-uy=><~]
-
-                    )
-                )
-            )
-        """
-        brace_pair = re.compile(rf"([\{{\}}]){ansi_regex}+\1", re.VERBOSE)
-
         def smush_braces(x: str):
             # Remove ansi codes from within braces
-            return re.sub(brace_pair, r"\1\1", x, count=0)
+            return _BRACE_PAIR.sub(r"\1\1", x)
 
         return smush_braces(
             self._highlight(merged)
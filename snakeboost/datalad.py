@@ -13,7 +13,7 @@ import more_itertools as itx
 
 from snakeboost.bash.cmd import echo
 from snakeboost.bash.statement import Flock, ShBlock, ShFor, ShIf, ShVar, subsh
-from snakeboost.utils import get_replacement_field, resolve, split
+from snakeboost.utils import get_replacement_field, resolve
 
 __all__ = ["Datalad"]
 
@@ -115,7 +115,7 @@ class Datalad:
                 # etc)
                 ShFor(
                     _path := ShVar(),
-                    _in=split(" ".join(field for field in value)),
+                    _in=" ".join(field for field in value),
                 )
                 >> (
                     ShIf(
@@ -1,29 +1,50 @@
 from __future__ import annotations
 
-import argparse
-import re
-import json
-import shlex
+import functools as ft
+import sys
 from pathlib import Path
-from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
 from typing_extensions import TypeAlias
 
+if TYPE_CHECKING:
+    import argparse
+
 
-def _mapping(arg: str, values: Iterable[str]):
-    return " ".join([f"--{arg} labelled {v} \"{{{arg}.{v}}}\"" for v in values])
+@ft.lru_cache(maxsize=512)
+def _mapping(arg: str, values: Tuple[str, ...]):
+    # Rules typically share a handful of name lists, so the mapping is cached
+    prefix = f"--{arg} labelled"
+    return " ".join([f'{prefix} {v} "{{{arg}.{v}}}"' for v in values])
 
 
 PyscriptParam = Union[List[str], Dict[str, str]]
 
+# Order in which snakemake data is passed on the command line
+_ARG_NAMES = ("input", "output", "params", "wildcards", "resources", "log")
+
 
 def _get_arg(arg: str, value: Optional[PyscriptParam]):
     if value is None:
         return f'--{arg} unlabelled "{{{arg}}}"'
     if isinstance(value, dict):
-        return " ".join([
-            f'--{arg} labelled {name} "{v}"' for name, v in value.items()
-        ])
-    return _mapping(arg, value)
+        return _labelled(arg, tuple((name, str(v)) for name, v in value.items()))
+    return _mapping(arg, tuple(value))
+
+
+@ft.lru_cache(maxsize=512)
+def _labelled(arg: str, items: Tuple[Tuple[str, str], ...]):
+    return " ".join([f'--{arg} labelled {name} "{v}"' for name, v in items])
 
 
 # pylint: disable=redefined-builtin, attribute-defined-outside-init
@@ -39,8 +60,11 @@ class Pyscript:
     place of the bash script. It can also be combined with Pipenv by wrapping it with
     the :func:`PipEnv.script` function.
 
-    Currently, only items serializable as strings can be provided. This includes text,
-    numbers, Paths, etc. Complex objects may be supported in the future.
+    Items are passed to the script as strings. This includes text, numbers, Paths,
+    etc. Params holding more complex json-serializable objects (lists, dicts, etc.)
+    can be wrapped with :meth:`serialize`, which encodes them as ``b64:`` followed by
+    the base64 encoded json. Such params are decoded back into objects by
+    :func:`snakemake_args`.
 
     The data will be provided to the script via SnakemakeArgs.
 
@@ -68,7 +92,7 @@ class Pyscript:
 
     def __init__(self, snakefile_dir: Union[str, Path]):
         self.snakefile_dir = Path(snakefile_dir)
-
+        self._resolved: Dict[str, Path] = {}
 
     # pylint: disable=too-many-arguments
     def __call__(
@@ -113,14 +137,7 @@ class Pyscript:
         Raises:
             FileExistsError: Raised if the specified script does not exist
         """
-        resolved_script = (self.snakefile_dir / script).resolve()
-
-        if not Path(resolved_script).exists():
-            raise FileExistsError(
-                f"Could not find script: {script}\n"
-                "Be sure to define paths relative to the app root, not the workflow "
-                "root."
-            )
+        resolved_script = self._resolve_script(script)
         if python_path is None:
             executable = "python"
         else:
@@ -128,22 +145,46 @@ class Pyscript:
         args = " ".join(
             [
                 _get_arg(arg, value)
-                for arg, value in {
-                    "input": input,
-                    "output": output,
-                    "params": params,
-                    "wildcards": wildcards,
-                    "resources": resources,
-                    "log": log,
-                }.items()
+                for arg, value in zip(
+                    _ARG_NAMES, (input, output, params, wildcards, resources, log)
+                )
             ]
         )
 
         return f"{executable} {resolved_script} {args} --threads {{threads}}"
 
+    def _resolve_script(self, script: str):
+        # The same script is typically called by many rules, so only hit the
+        # filesystem the first time each one is seen
+        resolved = self._resolved.get(script)
+        if resolved is None:
+            resolved = (self.snakefile_dir / script).resolve()
+            if not resolved.is_file():
+                raise FileExistsError(
+                    f"Could not find script: {script}\n"
+                    "Be sure to define paths relative to the app root, not the "
+                    "workflow root."
+                )
+            self._resolved[script] = resolved
+        return resolved
+
     @staticmethod
     def serialize(expr: Any):
-        return shlex.quote(shlex.quote(json.dumps(expr)))
+        """Encode a json-serializable object for passing to a script
+
+        The object is dumped to json and base64 encoded, so the result contains no
+        characters needing shell quoting. :func:`snakemake_args` recognizes the
+        encoded value and returns the decoded object in its place.
+
+        Values encoded by earlier versions (json quoted with ``shlex.quote``) are still
+        passed to the script as plain strings.
+        """
+        # pylint: disable=import-outside-toplevel
+        import base64
+        import json
+
+        encoded = base64.b64encode(json.dumps(expr).encode("utf-8")).decode("ascii")
+        return _SERIALIZED_PREFIX + encoded
 
 
 class ParseError(Exception):
@@ -155,28 +196,87 @@ T = TypeVar("T")
 SnakemakeSequenceArg: TypeAlias = "list[T] | dict[str, T | list[T]]"
 
 
+_SERIALIZED_PREFIX = "b64:"
+
+
+def _convert(converter: Callable[[str], T], value: str, decode: bool = False) -> Any:
+    if decode and value.startswith(_SERIALIZED_PREFIX):
+        # pylint: disable=import-outside-toplevel
+        import base64
+        import json
+
+        try:
+            return json.loads(base64.b64decode(value[len(_SERIALIZED_PREFIX) :]))
+        except ValueError:
+            # Not an encoded value after all; binascii and json errors both land here
+            pass
+    return converter(value)
+
+
 def _parse_snakemake_labelled_arg(
-    converter: Callable[[str], T], values: List[str]
+    converter: Callable[[str], T], values: List[str], decode: bool = False
 ) -> tuple[str, T | list[T]]:
+    import shlex  # pylint: disable=import-outside-toplevel
+
     label = values[0]
     split = shlex.split(values[1])
     if len(split) == 1:
-        return label, converter(split[0])
-    return label, [converter(v) for v in split]
+        return label, _convert(converter, split[0], decode)
+    return label, [_convert(converter, v, decode) for v in split]
+
 
+def _parse_snakemake_arg(
+    converter: Callable[[str], T], values: List[List[str]], decode: bool = False
+) -> SnakemakeSequenceArg[T]:
+    import shlex  # pylint: disable=import-outside-toplevel
 
-def _parse_snakemake_arg(converter: Callable[[str], T], values: List[List[str]]) -> SnakemakeSequenceArg[T]:
     if not values:
         return []
-    argtypes, *_ = zip(*values)
-    argtype = set(argtypes)
-    if argtype not in ({"labelled"}, {"unlabelled"}):
+    argtype = values[0][0] if values[0] else None
+    if argtype not in ("labelled", "unlabelled"):
         raise ParseError("All args must be labelled or unlabelled")
-    argtype = argtype.pop()
-    if argtype == "unlabelled":
-        return [converter(v) for _set in values for v in shlex.split(_set[1])]
-    else:
-        return dict(_parse_snakemake_labelled_arg(converter, _set[1:]) for _set in values)
+    unlabelled: List[T] = []
+    labelled: Dict[str, T | List[T]] = {}
+    # Check and convert in the same pass over the values
+    for _set in values:
+        if not _set or _set[0] != argtype:
+            raise ParseError("All args must be labelled or unlabelled")
+        if argtype == "unlabelled":
+            unlabelled.extend(
+                _convert(converter, v, decode) for v in shlex.split(_set[1])
+            )
+        else:
+            label, parsed = _parse_snakemake_labelled_arg(converter, _set[1:], decode)
+            labelled[label] = parsed
+    return unlabelled if argtype == "unlabelled" else labelled
+
+
+class _Unparsed:
+    __slots__ = ("values",)
+
+    def __init__(self, values: List[List[str]]):
+        self.values = values
+
+
+class _LazyPathArg:
+    """Snakemake arg stored raw and converted into Paths on first access"""
+
+    def __set_name__(self, owner: type, name: str):
+        # pylint: disable=attribute-defined-outside-init
+        self.slot = f"_{name}"
+
+    def __get__(self, obj: Any, objtype: Any = None):
+        if obj is None:
+            return self
+        value = getattr(obj, self.slot)
+        if isinstance(value, _Unparsed):
+            value = _parse_snakemake_arg(Path, value.values)
+            setattr(obj, self.slot, value)
+        return value
+
+    def __set__(self, obj: Any, value: Any):
+        setattr(obj, self.slot, value)
+
 
 # pylint: disable=redefined-builtin, too-many-arguments
 class SnakemakeArgs:
@@ -196,8 +296,25 @@ class SnakemakeArgs:
         threads (int)
         resources (List or Dict of str)
         log (List or Dict of paths)
+
+    Paths are only constructed when input, output, or log is first accessed, so
+    scripts don't pay for the fields they don't use.
     """
 
+    __slots__ = (
+        "_input",
+        "_output",
+        "params",
+        "wildcards",
+        "threads",
+        "resources",
+        "_log",
+    )
+
+    input = _LazyPathArg()
+    output = _LazyPathArg()
+    log = _LazyPathArg()
+
     def __init__(
         self,
         input: list[list[str]],
@@ -208,30 +325,26 @@ class SnakemakeArgs:
         resources: list[list[str]],
         log: list[list[str]],
     ):
-        self.input = _parse_snakemake_arg(Path, input)
-        self.output = _parse_snakemake_arg(Path, output)
-        self.params = _parse_snakemake_arg(str, params)
+        self.input = _Unparsed(input)
+        self.output = _Unparsed(output)
+        # Only params can hold values encoded with Pyscript.serialize
+        self.params = _parse_snakemake_arg(str, params, decode=True)
         self.wildcards = _parse_snakemake_arg(str, wildcards)
         self.threads = int(threads)
         self.resources = _parse_snakemake_arg(str, resources)
-        self.log = _parse_snakemake_arg(Path, log)
+        self.log = _Unparsed(log)
 
     def __eq__(self, obj: object):
-        if not isinstance(obj, SnakemakeArgs):
-            return False
-        if not all(
-            [
-                obj.input == self.input,
-                obj.output == self.output,
-                obj.params == self.params,
-                obj.wildcards == self.wildcards,
-                self.resources == self.resources,
-                self.threads == self.threads,
-                obj.log == self.log,
-            ]
-        ):
-            return False
-        return True
+        return (
+            isinstance(obj, SnakemakeArgs)
+            and obj.input == self.input
+            and obj.output == self.output
+            and obj.params == self.params
+            and obj.wildcards == self.wildcards
+            and obj.resources == self.resources
+            and obj.threads == self.threads
+            and obj.log == self.log
+        )
 
 
 def snakemake_parser():
@@ -241,6 +354,9 @@ def snakemake_parser():
     -------
     Argument Parser
     """
+    # argparse is only needed on the script side, so keep it off the import path
+    import argparse  # pylint: disable=import-outside-toplevel
+
     parser = argparse.ArgumentParser()
     parser.add_argument("--input", nargs="*", action="append", default=[])
     parser.add_argument("--output", nargs="*", action="append", default=[])
@@ -252,13 +368,48 @@ def snakemake_parser():
     return parser
 
 
+@ft.lru_cache(maxsize=1)
+def _default_parser():
+    return snakemake_parser()
+
+
+_SNAKEMAKE_FLAGS = {f"--{name}": name for name in (*_ARG_NAMES, "threads")}
+
+
+def _fast_parse(argv: List[str]) -> Optional[Dict[str, Any]]:
+    """Parse the command line generated by Pyscript without argparse
+
+    Gives the same result as :func:`snakemake_parser`, but only understands the
+    standard flags and their values. Returns None if anything else is found, so that
+    argparse can be used to parse (or reject) the arguments instead.
+    """
+    parsed: Dict[str, List[List[str]]] = {
+        name: [] for name in _SNAKEMAKE_FLAGS.values()
+    }
+    current: Optional[List[str]] = None
+    for token in argv:
+        if token.startswith("-"):
+            if token not in _SNAKEMAKE_FLAGS:
+                return None
+            current = []
+            parsed[_SNAKEMAKE_FLAGS[token]].append(current)
+        elif current is None:
+            return None
+        else:
+            current.append(token)
+    threads = parsed.pop("threads")
+    if any(len(value) > 1 for value in threads):
+        return None
+    return {**parsed, "threads": threads[-1][0] if threads and threads[-1] else 0}
+
+
 ArgAlias = Union[str, Tuple[str, str]]
 ArgAliasGroup = Union[List[ArgAlias], Dict[str, ArgAlias]]
 
 
 def snakemake_args(
     argv: List[str] = None,
-    parser: argparse.ArgumentParser = snakemake_parser(),
+    parser: Optional[argparse.ArgumentParser] = None,
     input: ArgAliasGroup = None,
     output: ArgAliasGroup = None,
     params: ArgAliasGroup = None,
@@ -275,8 +426,9 @@ def snakemake_args(
         argv (optional list[str])
             List of arguments to parse. Uses ``sys.argv[1:]`` by default
         parser ( argparse.ArgumentParser , optional)
-            Argument parser to use. By default, uses the preconstructed snakemake_args
-            parser. This should be suitable for most applications.
+            Argument parser to use. By default, the parser from
+            :func:`snakemake_parser` is used, built once and reused across calls.
+            This should be suitable for most applications.
 
     Returns:
         :class:`SnakemakeArgs`
@@ -289,59 +441,63 @@ def snakemake_args(
         resources=resources or [],
         log=log or [],
     )
-    for aliases in alias_cats.values():
-        _add_arg_aliases(aliases, parser)
+    has_aliases = any(alias_cats.values())
+    if parser is None and not has_aliases:
+        fast_parsed = _fast_parse(sys.argv[1:] if argv is None else argv)
+        if fast_parsed is not None:
+            return SnakemakeArgs(**fast_parsed)
+    if parser is None:
+        # Aliases are added directly to the parser, so only the alias-free parser
+        # can be shared between calls
+        parser = snakemake_parser() if has_aliases else _default_parser()
+    alias_dests = {
+        alias_cat: _add_arg_aliases(aliases, parser)
+        for alias_cat, aliases in alias_cats.items()
+    }
     args = parser.parse_args(argv)
     parsed = args.__dict__
-    for alias_cat, aliases in alias_cats.items():
-        parsed_alias = _parse_arg_alias(args, aliases)
-        parsed[alias_cat].extend(parsed_alias)
+    for alias_cat, dests in alias_dests.items():
+        # Build a new list rather than extending, as the parsed value may be the
+        # parser's own default list
+        parsed[alias_cat] = [*parsed[alias_cat], *_parse_arg_alias(parsed, dests)]
     parsed = {k: v for k, v in parsed.items() if k in [*alias_cats, "threads"]}
     return SnakemakeArgs(**parsed)
 
 
-def _add_arg_alias(alias: ArgAlias, parser: argparse.ArgumentParser):
-    if isinstance(alias, str):
-        parser.add_argument(alias, nargs="?", default="")
-    else:
-        parser.add_argument(alias[0], nargs="?", default=alias[1])
+AliasDest = Tuple[Optional[str], str]
 
 
-def _add_arg_aliases(aliases: ArgAliasGroup, parser: argparse.ArgumentParser):
-    if isinstance(aliases, dict):
-        for alias in aliases.values():
-            _add_arg_alias(alias, parser)
-    if isinstance(aliases, list):
-        for alias in aliases:
-            _add_arg_alias(alias, parser)
-
+def _add_arg_alias(alias: ArgAlias, parser: argparse.ArgumentParser) -> str:
+    if isinstance(alias, str):
+        return parser.add_argument(alias, nargs="?", default="").dest
+    return parser.add_argument(alias[0], nargs="?", default=alias[1]).dest
 
-def _parse_arg_alias(namespace: argparse.Namespace, aliases: ArgAliasGroup):
-    def get_alias(alias: ArgAlias):
-        if isinstance(alias, str):
-            return alias
-        return alias[0]
 
+def _add_arg_aliases(
+    aliases: ArgAliasGroup, parser: argparse.ArgumentParser
+) -> List[AliasDest]:
+    """Register aliases on the parser, returning the (label, dest) of each"""
     if isinstance(aliases, dict):
-        for name, alias in aliases.items():
-            arg = _get_arg_from_namespace(namespace, get_alias(alias))
-            if arg:
-                yield ["labelled", name, arg]
-    if isinstance(aliases, list):
-        for alias in aliases:
-            arg = _get_arg_from_namespace(namespace, get_alias(alias))
-            if arg:
-                yield ["unlabelled", arg]
-
-
-def _get_arg_from_namespace(namespace: argparse.Namespace, arg_name: str):
-    attr = re.sub(r"\-", "_", re.sub(r"^(--(?=[^-])|-(?=[^-]))", "", arg_name))
-    return getattr(namespace, attr)
+        return [
+            (name, _add_arg_alias(alias, parser)) for name, alias in aliases.items()
+        ]
+    return [(None, _add_arg_alias(alias, parser)) for alias in aliases]
+
+
+def _parse_arg_alias(parsed: Dict[str, Any], dests: List[AliasDest]):
+    for name, dest in dests:
+        arg = parsed.get(dest)
+        if not arg:
+            continue
+        if name is None:
+            yield ["unlabelled", arg]
+        else:
+            yield ["labelled", name, arg]
 
 
 if __name__ == "__main__":
     print(
         snakemake_args(
-            argv=["me", "--input", "unlabelled", "hello", "world"], input=['first']
+            argv=["me", "--input", "unlabelled", "hello", "world"], input=["first"]
         ).input
     )
@@ -1,46 +1,116 @@
 # noqa: E131
 from __future__ import absolute_import
+import functools as ft
 import os
 
 from pathlib import Path
-from typing import Callable, Iterable, List, Optional, Union
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 import attr
+from typing_extensions import Literal
 
 from snakeboost.bash import Flock, ShBlock, ShIf, ShVar
 from snakeboost.bash.cmd import echo, ls, mkdir
+from snakeboost.bash.globals import Globals
 from snakeboost.bash.statement import subsh
+from snakeboost.bash.utils import quote_escape
 from snakeboost.general import BashWrapper, ScriptComp
-from snakeboost.utils import get_hash, hash_path, lockfile, rm_if_exists
+from snakeboost.utils import get_hash, hash_path, lockfile
 
 __all__ = ["Tar"]
 
 
-def _strip_braces(items: Optional[List[str]]):
+def _compress_program(
+    compression: str, threads: Union[int, str, None], level: Optional[int]
+):
+    """Compression program for tar. gzip is swapped for pigz when installed, for
+    parallel (de)compression"""
+    level_flag = "" if level is None else f" -{level}"
+    if compression == "zst":
+        return f'"zstd -T{0 if threads is None else threads}{level_flag}"'
+    if threads is None:
+        threads = "${{SNAKEBOOST_PIGZ_THREADS:-$(nproc)}}"
+    pigz = f"pigz -p {threads}{level_flag}"
+    return f'"$(command -v pigz >/dev/null && echo "{pigz}" || echo gzip{level_flag})"'
+
+
+def _strip_braces(items: Optional[Iterable[str]]):
     if items is not None:
-        return [item.strip(" {}\t\n") for item in items]
+        return tuple(item.strip(" {}\t\n") for item in items)
     return items
 
 
+@ft.lru_cache(maxsize=None)
+def _hash_list(items: Tuple[str, ...]):
+    return get_hash(str(sorted(items)))
+
+
+def _resolve_root(root: Union[Path, str]):
+    return Path(root).resolve()
+
+
 def _get_tar_wrapper(
     files: Optional[Iterable[str]],
-    factory: Callable[[str, ShVar], ScriptComp],
-    mount: Callable[[str], Union[Path, str]],
+    factory: Callable[[str, ShVar, Optional[str]], ScriptComp],
+    mount: Callable[[str, Optional[str]], Union[Path, str]],
+    hashed: bool = True,
 ):
-    mounts = {path: ShVar(mount(f"{{{path}}}")) for path in files or []}
+    """Build the wrapper for a set of tar files
 
-    return BashWrapper(
-        comps=tuple(
+    If hashed, each path is hashed once into a variable, and a reference to it is
+    passed to mount and factory as the path's digest
+    """
+    if not files:
+        return BashWrapper()
+    comps = []
+    mounts = {}
+    for path in files:
+        file = f"{{{path}}}"
+        digest = ShVar(hash_path(file)) if hashed else None
+        ref = f"${digest.name}" if digest else None
+        mounts[path] = ShVar(mount(file, ref))
+        comps.append(
             attr.evolve(
-                factory(f"{{{file}}}", mount),
-                assignments=mount,
+                factory(file, mounts[path], ref), assignments=(digest, mounts[path])
             )
-            for file, mount in mounts.items()
-        ),
-        subs=mounts,
+        )
+
+    return BashWrapper(comps=tuple(comps), subs=mounts)
+
+
+def _make_mounts(wrapper: BashWrapper, *dirs: Path):
+    """Create every mount directory up front, using a single mkdir"""
+    if not wrapper.subs:
+        return wrapper
+    paths = " ".join(str(path) for path in (*dirs, *wrapper.subs.values()))
+    return attr.evolve(
+        wrapper, comps=(ScriptComp(before=mkdir(paths).p), *wrapper.comps)
     )
 
 
+def _parallelize(wrapper: BashWrapper, phase: str):
+    """Run the scripts of each component in the given phase as background jobs
+
+    Each job is then waited on individually, so that a failure in any of them still
+    fails the script
+    """
+    if sum(1 for comp in wrapper.comps if getattr(comp, phase)) < 2:
+        return wrapper
+    comps = []
+    pids = []
+    for comp in wrapper.comps:
+        script = getattr(comp, phase)
+        if script:
+            pid = ShVar()
+            pids.append(pid)
+            comp = attr.evolve(comp, **{phase: f"{ShBlock(script)} & {pid.name}=$!"})
+        comps.append(comp)
+    # The waits must run in the current shell, which owns the jobs, not a subshell
+    waits = ShBlock(*(f"wait ${pid.name}" for pid in pids), wrap=False)
+    comps.append(ScriptComp(**{phase: waits}))
+    return attr.evolve(wrapper, comps=tuple(comps))
+
+
 @attr.frozen
 class Tar:
     """Functions to handle manipulation of .tar files in Snakemake
@@ -52,39 +122,69 @@ class Tar:
         root (Path or str):
             The directory in which to place the open tarfile directories. Intended to be
             a temporary directory
+        parallel (bool):
+            Extract and pack tar files concurrently rather than one after the other
+        threads (int or str):
+            Number of threads used to (de)compress tar files. Use "{threads}" for the
+            rule's threads. Defaults to all available cores, or, for gzip, the value
+            of $SNAKEBOOST_PIGZ_THREADS if set
+        compression ("gz" or "zst"):
+            Compression used for tar files: gzip (the default), or zstd, which is much
+            faster to both pack and extract
+        compress_level (int):
+            Compression level used when packing tar files, e.g. 1 for the fastest
+            compression. Defaults to the compressor's own default
     """
 
-    _root: Path = attr.ib(converter=Path)
-    inputs: Optional[List[str]] = attr.field(default=None, converter=_strip_braces)
-    mut_inputs: Optional[List[str]] = attr.field(default=None, converter=_strip_braces)
-    outputs: Optional[List[str]] = attr.field(default=None, converter=_strip_braces)
-    modify: Optional[List[str]] = attr.field(default=None, converter=_strip_braces)
+    _root: Path = attr.ib(converter=_resolve_root)
+    inputs: Optional[Tuple[str, ...]] = attr.field(
+        default=None, converter=_strip_braces
+    )
+    mut_inputs: Optional[Tuple[str, ...]] = attr.field(
+        default=None, converter=_strip_braces
+    )
+    outputs: Optional[Tuple[str, ...]] = attr.field(
+        default=None, converter=_strip_braces
+    )
+    modify: Optional[Tuple[str, ...]] = attr.field(
+        default=None, converter=_strip_braces
+    )
     dereference: bool = False
+    parallel: bool = False
+    threads: Union[int, str, None] = None
+    compression: Literal["gz", "zst"] = attr.field(
+        default="gz", validator=attr.validators.in_(("gz", "zst"))
+    )
+    compress_level: Optional[int] = None
+    # Rendered scripts, keyed by command and debug setting
+    _scripts: Dict[Tuple[str, bool], str] = attr.field(
+        factory=dict, init=False, eq=False, repr=False
+    )
 
     @property
     def hash(self) -> str:
         return get_hash(
             "".join(
                 [
-                    self._hash_list(self.inputs or []),
-                    self._hash_list(self.mut_inputs or []),
-                    self._hash_list(self.outputs or []),
-                    self._hash_list(self.modify or []),
+                    _hash_list(self.inputs or ()),
+                    _hash_list(self.mut_inputs or ()),
+                    _hash_list(self.outputs or ()),
+                    _hash_list(self.modify or ()),
                 ]
             )
         )
 
-    @staticmethod
-    def _hash_list(_list: List[str]):
-        return get_hash(str(sorted(_list)))
+    @property
+    def _program(self):
+        return _compress_program(self.compression, self.threads, self.compress_level)
 
     @property
     def root(self):
-        return self._root.resolve() / "__snakemake_tarfiles__"
+        return self._root / "__snakemake_tarfiles__"
 
     @property
     def timestamps(self):
-        return self._root.resolve() / "__snakemake_tarfile_timestamps__"
+        return self._root / "__snakemake_tarfile_timestamps__"
 
     # pylint: disable=too-many-arguments
     def using(
@@ -94,6 +194,8 @@ class Tar:
         outputs: Optional[List[str]] = None,
         modify: Optional[List[str]] = None,
         dereference: Optional[bool] = None,
+        parallel: Optional[bool] = None,
+        threads: Union[int, str, None] = attr.NOTHING,  # type: ignore
     ):
         """Set inputs, outputs, and modifies for tarring, and other settings
 
@@ -108,7 +210,8 @@ class Tar:
           job, the symlink is automatically closed. Contents should not be modified; to
           facilitate this, the file permissions within are changed to readonly. The
           untarred folder is cached for future use, so modifications could propogate to
-          future work
+          future work. The cache is refreshed if the tarfile is replaced, or if its
+          mtime or size changes
 
         - **Mutable Inputs**: Like inputs, but allow modification of the contents. The
           tar file will be deleted upon completetion.
@@ -123,8 +226,9 @@ class Tar:
           usual for Snakemake, however an error will be thrown if any `output.swap` is
           found (e.g. `file.tar.gz.out`)
 
-        All files are g-zipped, so `.tar.gz` should be used as the extension for all
-        inputs and outputs affected by the function
+        All files are compressed according to ``compression``, so `.tar.gz` (or
+        `.tar.zst`) should be used as the extension for all inputs and outputs
+        affected by the function
 
         Parameters:
             inputs (List of str):
@@ -137,14 +241,34 @@ class Tar:
                 List of files to modify
             dereference: (optional bool):
                 Use the -h flag when saving tar files to dereference all symlinks
+            parallel: (optional bool):
+                Extract and pack tar files concurrently rather than one after the
+                other
+            threads: (optional int or str):
+                Number of threads used to (de)compress tar files. Use "{threads}" for
+                the rule's threads, or None to go back to the default. Left unchanged
+                if not given
 
         Returns:
             Tar: A fresh Tar instance with the update inputs, outputs, and modifies
         """
         if dereference is None:
             dereference = self.dereference
+        if parallel is None:
+            parallel = self.parallel
+        if threads is attr.NOTHING:
+            threads = self.threads
         return self.__class__(
-            self._root, inputs, mut_inputs, outputs, modify, dereference
+            self._root,
+            inputs,
+            mut_inputs,
+            outputs,
+            modify,
+            dereference,
+            parallel,
+            threads,
+            self.compression,
+            self.compress_level,
         )
 
     def __call__(self, cmd: str, *, signature: bool = False):
@@ -159,69 +283,99 @@ class Tar:
         """
         if signature:
             return self.hash
-        return BashWrapper.merge(
+        key = (cmd, Globals.DEBUG)
+        if key not in self._scripts:
+            self._scripts[key] = self._wrap(cmd)
+        return self._scripts[key]
+
+    def _wrap(self, cmd: str):
+        wrapper = BashWrapper.merge(
             [
                 _get_tar_wrapper(
                     files=self.inputs,
-                    factory=lambda src, mount: ScriptComp(
-                        before=Flock(lockfile(src, self.root), wait=0, error=False).do(
-                            _mount_tar(src, mount)
-                        ),
-                        inner_mod=lambda s: Flock(lockfile(src, self.root), shared=True)
-                        .do(f"chmod -R a-w {mount}", s)
-                        .to_str(),
-                        after=Flock(lockfile(src, self.root), wait=0, error=False).do(
-                            f"chmod -R a+w {mount}"
-                        ),
-                    ),
+                    factory=self._open_input,
                     mount=self._public_mount,
                 ),
                 _get_tar_wrapper(
                     files=self.mut_inputs,
-                    factory=lambda src, mount: ScriptComp(
-                        before=_mount_tar(src, mount),
+                    factory=lambda src, mount, _: ScriptComp(
+                        before=_mount_tar(src, mount, self._program),
                         after=_rm_mount(mount),
                     ),
                     mount=self._private_mount,
+                    hashed=False,
                 ),
                 _get_tar_wrapper(
                     files=self.outputs,
-                    factory=lambda dest, mount: ScriptComp(
+                    factory=lambda dest, mount, digest: ScriptComp(
                         outer_mod=lambda s: self._modification_lock(dest, s),
                         before=_tar_output(mount),
-                        success=_save_tar(dest, mount, self.dereference),
+                        success=(
+                            _save_tar(dest, mount, self.dereference, self._program),
+                            _lock_files(mount),
+                            _save_stamp(dest, self._stamp(digest)),
+                        ),
                         failure=_rm_mount(mount),
                     ),
                     mount=self._public_mount,
                 ),
                 _get_tar_wrapper(
                     files=self.modify,
-                    factory=lambda tar, mount: ScriptComp(
-                        before=_mount_tar(tar, mount),
+                    factory=lambda tar, mount, digest: ScriptComp(
+                        before=(
+                            _mount_tar(tar, mount, self._program, self._stamp(digest)),
+                            _unlock_files(mount),
+                        ),
                         outer_mod=lambda s: self._modification_lock(tar, s),
-                        success=_save_tar(tar, mount, self.dereference),
+                        success=(
+                            _save_tar(tar, mount, self.dereference, self._program),
+                            _lock_files(mount),
+                            _save_stamp(tar, self._stamp(digest)),
+                        ),
                         failure=_rm_mount(mount),
                     ),
                     mount=self._public_mount,
                 ),
             ]
-        ).format_script(cmd)
-
-    def _public_mount(self, file: str):
-        return (
-            os.path.join(self.root, hash_path(file))
-            + os.path.sep
-            + str(subsh(rf"basename {file} | sed -E 's/\.tar\.gz$//'"))
         )
+        if self.parallel:
+            wrapper = _parallelize(_parallelize(wrapper, "before"), "success")
+        return _make_mounts(wrapper, self.timestamps).format_script(cmd)
+
+    def _open_input(self, src: str, mount: ShVar, digest: str):
+        lock = lockfile(src, self.root, digest)
+        stamp = self._stamp(digest)
+        return ScriptComp(
+            before=Flock(lock, wait=0, error=False).do(
+                _mount_tar(src, mount, self._program, stamp, readonly=True)
+            ),
+            inner_mod=lambda s: Flock(lock, shared=True).do(s).to_str(),
+        )
+
+    def _public_mount(self, file: str, digest: str):
+        return os.path.join(self.root, digest, str(self._stem(file)))
 
-    def _private_mount(self, file: str):
-        filename = subsh(rf"basename {file} | sed -E 's/\.tar\.gz$//'")
+    def _private_mount(self, file: str, _digest: Optional[str]):
+        tmpdir = subsh(f"mktemp -d --tmpdir={self.root}")
         return subsh(
             mkdir(self.root).p,
-            f'printf \'%s/%s\' "$(mktemp -d --tmpdir={self.root})" "{filename}"',
+            f'printf \'%s/%s\' "{tmpdir}" "{self._stem(file)}"',
         )
 
+    def _stem(self, file: str):
+        """Basename of file without its .tar suffix, using only shell builtins"""
+        return subsh(
+            f"name='{quote_escape(file)}'",
+            "name=${{name##*/}}",
+            f'echo "${{{{name%.tar.{self.compression}}}}}"',
+        )
+
+    def _stamp(self, digest: str):
+        return os.path.join(self.timestamps, digest)
+
     def _modification_lock(self, tarfile: str, script: str):
+        # The lock wraps the whole script, including the digest assignments, so it
+        # computes its own hash
         return (
             Flock(lockfile(tarfile, self.root), wait=0)
             .do(script)
@@ -237,20 +391,29 @@ class Tar:
 
 
 def _tar_output(mount: ShVar):
-    return (
-        (ShIf.is_dir(mount) & ShIf.n(ls(mount).A)) >> (f"rm -rf {mount}/*"),
-        mkdir(mount).p,
-    )
+    return f"find {mount} -mindepth 1 -delete"
+
 
+def _lock_files(mount: ShVar):
+    """Remove write permission from the files in mount
 
-def _save_tar(tarfile: str, mount: ShVar, dereference: bool):
-    flags = "-hczf" if dereference else "-czf"
+    Directories are left writable, so the mount can still be cleared or deleted
+    """
+    return f"find {mount} -type f -exec chmod a-w {{{{}}}} +"
+
+
+def _unlock_files(mount: ShVar):
+    """Restore write permission on the files in mount that were locked"""
+    return f"find {mount} -type f ! -perm -u=w -exec chmod u+w {{{{}}}} +"
+
+
+def _save_tar(tarfile: str, mount: ShVar, dereference: bool, program: str):
+    flags = "-hcf" if dereference else "-cf"
     return (
         echo(f"Packing tar file: {tarfile}"),
-        f"tar {flags} {mount}.tar.gz -C {mount} .",
-        f"mv {mount}.tar.gz {tarfile}.tmp",
-        rm_if_exists(tarfile),
-        f"mv {tarfile}.tmp {tarfile}",
+        # Write 1MiB records (2048 blocks) rather than tar's default of 10KiB
+        f"tar {flags} {tarfile}.tmp -b 2048 -I {program} -C {mount} .",
+        f"mv -fT {tarfile}.tmp {tarfile}",
     )
 
 
@@ -258,13 +421,46 @@ def _rm_mount(mount: ShVar):
     return f"rm -rf {mount}"
 
 
-def _mount_tar(tarfile: str, mount: ShVar):
-    cmd = (ShIf.isnt().is_dir(mount) | ShIf.empty(ls(mount).A)).then(
-        mkdir(mount).p,
+def _tar_stamp(tarfile: str):
+    return f"stat -Lc '%.9Y %s %i' {tarfile}"
+
+
+def _save_stamp(tarfile: str, stamp: str):
+    """Record the tarfile's mtime, size and inode, marking its mount as up to date"""
+    return f"{_tar_stamp(tarfile)} > {stamp}"
+
+
+def _mount_tar(
+    tarfile: str,
+    mount: ShVar,
+    program: str,
+    stamp: Optional[str] = None,
+    readonly: bool = False,
+):
+    """Extract tarfile into mount, unless it has already been extracted there
+
+    The mount directory itself must already exist. If a stamp file is given, an
+    existing mount is only reused if the stamp matches the current tarfile.
+    Otherwise, the mount is cleared and extracted afresh. If readonly, write
+    permissions are removed from the freshly extracted files (but not directories),
+    so reused mounts are never walked again.
+    """
+    unmounted = ShIf.empty(ls(mount).A)
+    extract = (
         echo(f"Extracting and stowing tarfile: '{tarfile}'"),
-        f"tar -xzf {tarfile} -C {mount}",
+        # Ownership and modes from the archive aren't needed, so skip restoring them
+        f"tar -xf {tarfile} -I {program} -C {mount} "
+        "--no-same-owner --no-same-permissions",
+        _lock_files(mount) if readonly else "",
+    )
+    if stamp is None:
+        return unmounted.then(*extract)
+    stale = ShIf(f'"$(cat {stamp} 2>/dev/null)"').ne(f'"$({_tar_stamp(tarfile)})"')
+    return (unmounted | stale).then(
+        f"find {mount} -mindepth 1 -delete",
+        *extract,
+        _save_stamp(tarfile, stamp),
     )
-    return cmd
 
 
 if __name__ == "__main__":
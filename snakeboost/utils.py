@@ -1,11 +1,13 @@
 # pylint: disable=missing-class-docstring, invalid-name
 from __future__ import absolute_import
 
+import functools as ft
 import hashlib
+import re
 from pathlib import Path
 from typing import Optional, Union
 
-from snakeboost.bash.cmd import StringLike, echo
+from snakeboost.bash.cmd import StringLike
 from snakeboost.bash.statement import ShIf, subsh
 from snakeboost.bash.utils import quote_escape
 
@@ -17,23 +19,18 @@ def get_replacement_field(
 ):
     if not field_name:
         return ""
-    contents = "".join(
-        filter(
-            None,
-            [
-                field_name,
-                f"!{conversion}" if conversion else None,
-                f":{format_spec}" if format_spec else None,
-            ],
-        )
-    )
+    contents = field_name
+    if conversion:
+        contents += f"!{conversion}"
+    if format_spec:
+        contents += f":{format_spec}"
     return f"{{{contents}}}"
 
 
-def lockfile(path: Union[Path, str], root: Path):
+def lockfile(path: Union[Path, str], root: Path, digest: Optional[str] = None):
     loc = root / ".lock"
     loc.mkdir(exist_ok=True, parents=True)
-    return loc / hash_path(str(path))
+    return loc / (hash_path(str(path)) if digest is None else digest)
 
 
 def silent_mv(src: str, dest: str):
@@ -51,8 +48,12 @@ def cp_timestamp(src: str, dest: str):
     return f"timestamp=$(stat -c %y {src}) && " f'touch -hd "$timestamp" {dest}'
 
 
+@ft.lru_cache(maxsize=None)
 def hash_path(name: str):
-    return f"$(realpath -s '{quote_escape(name)}' | md5sum | awk '{{{{print $1}}}}')"
+    # 64 bits is plenty to tell paths apart, and keeps mount paths short
+    return (
+        f"$(realpath -s '{quote_escape(name)}' | b2sum -l 64 | awk '{{{{print $1}}}}')"
+    )
 
 
 def rm_if_exists(path: StringLike, recursive: bool = False):
@@ -63,61 +64,40 @@ def rm_if_exists(path: StringLike, recursive: bool = False):
     return (ShIf.exists(path) | ShIf.is_symlink(path)) >> f"rm {flag} {path}"
 
 
-def split(text: str):
-    return subsh(echo(text))
-
-
 def resolve(path: StringLike, no_symlinks: bool = False):
     s = "-s" if no_symlinks else ""
     return subsh(f"realpath {s} {path}")
 
 
+@ft.lru_cache(maxsize=1024)
 def get_hash(items: str):
     encoded = items.encode("utf-8")
-    return hashlib.md5(encoded).hexdigest()
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
 
 
 def escaped(text: str, char_pos: int):
     return char_pos > 0 and text[char_pos - 1] == "\\"
 
 
-# pylint: disable=too-many-branches
+_QUOTE = re.compile("[\"']")
+
+# Quote state transitions, indexed as [curr + 1][event], where curr is -1 (within
+# double quotes), 0 (unquoted) or 1 (within single quotes), and event is
+# 0: escaped ", 1: ", 2: escaped ', 3: '
+# Double quotes are literal within single quotes, single quotes can't be escaped
+# within single quotes, and we don't worry about single quotes within double quotes
+_QUOTE_TRANSITIONS = (
+    (-1, 0, -1, -1),
+    (0, -1, 0, 1),
+    (1, 1, 0, 0),
+)
+
+
+@ft.lru_cache(maxsize=1024)
 def within_quotes(text: str, curr: int = 0) -> int:
-    double = text.index('"') if '"' in text else len(text)
-    single = text.index("'") if "'" in text else len(text)
-    if double == len(text) and single == len(text):
-        return curr
-
-    if curr == 0:
-        if double < single:
-            if escaped(text, double):
-                result = 0
-            else:
-                result = -1
-        else:
-            if escaped(text, single):
-                result = 0
-            else:
-                result = 1
-
-    elif curr == -1:
-        if double < single:
-            if escaped(text, double):
-                result = -1
-            else:
-                result = 0
-
-        # Don't worry about escaping single quote within double quote
-        else:
-            result = -1
-    else:
-        if double < single:
-            result = 1
-        # Can't escape single quote within single quotes
-        else:
-            result = 0
-
-    tail = min(double, single) + 1
-    if tail == len(text):
-        return result
-    return within_quotes(text[tail:], result)
+    # Only the quotes can change state, so jump straight from one to the next
+    for match in _QUOTE.finditer(text):
+        i = match.start()
+        event = (2 if match.group() == "'" else 0) + (not escaped(text, i))
+        curr = _QUOTE_TRANSITIONS[curr + 1][event]
+    return curr
@@ -1,10 +1,21 @@
 from __future__ import absolute_import
 
+import functools as ft
+
 import attr
 
 from snakeboost.utils import quote_escape
 
 
+@ft.lru_cache(maxsize=512)
+def _xvfb_wrap(cmd: str):
+    strict_cmd = "set -euo pipefail; " + cmd
+    return (
+        f"echo '{quote_escape(strict_cmd)}' | "
+        "if [[ -z ${{DISPLAY:-}} ]]; then xvfb-run -a bash; else bash; fi"
+    )
+
+
 # pylint: disable=too-few-public-methods
 @attr.frozen
 class XvfbRun:
@@ -27,8 +38,4 @@ class XvfbRun:
         Returns:
             str: The modified shell script
         """
-        strict_cmd = "set -euo pipefail; " + cmd
-        return (
-            f"echo '{quote_escape(strict_cmd)}' | "
-            "$([ -z ${{DISPLAY:-}} ] && echo 'xvfb-run -a ') bash"
-        )
+        return _xvfb_wrap(cmd)
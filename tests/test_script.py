@@ -10,8 +10,10 @@ from snakeboost.script import (
     Pyscript,
     SnakemakeArgs,
     _get_arg,
+    _fast_parse,
     _parse_snakemake_arg,
     snakemake_args,
+    snakemake_parser,
 )
 
 
@@ -128,3 +130,67 @@ def test_snakemake_args():
         resources=[],
         log="",
     )
+
+
+@pytest.mark.parametrize(
+    "argv",
+    (
+        [],
+        ["--threads", "4"],
+        ["--threads"],
+        ["--input", "unlabelled", "a b", "--output", "labelled", "x", "c"],
+        ["--input", "labelled", "x", "a", "--input", "labelled", "y", "", "--input"],
+        ["--params", "unlabelled", "=", "--threads", "1", "--threads", "2"],
+        ["--log", "unlabelled", "log.txt", "--wildcards", "--resources"],
+    ),
+)
+def test_fast_parse_matches_argparse(argv):
+    assert _fast_parse(argv) == vars(snakemake_parser().parse_args(argv))
+
+
+@pytest.mark.parametrize(
+    "argv",
+    (
+        ["positional"],
+        ["--input", "unlabelled", "-1"],
+        ["--inp", "unlabelled", "a"],
+        ["--input=unlabelled"],
+        ["--threads", "1", "2"],
+        ["--unknown"],
+    ),
+)
+def test_fast_parse_defers_to_argparse(argv):
+    assert _fast_parse(argv) is None
+
+
+@pytest.mark.parametrize("alias", ("--x", "-x", "--x-y"))
+def test_snakemake_args_aliases(alias):
+    argv = [alias, "path/to/a", "--threads", "1"]
+    assert snakemake_args(argv, input=[alias]).input == [Path("path/to/a")]
+    assert snakemake_args(argv, input={"a": alias}).input == {"a": Path("path/to/a")}
+
+
+def test_serialize_round_trip():
+    obj = {"list": [1, 2.5, None], "quotes": 'it\'s "quoted"'}
+    serialized = Pyscript.serialize(obj)
+    args = snakemake_args(
+        ["--params", "labelled", "obj", serialized, "--params", "labelled", "x", "y"]
+    )
+    assert args.params == {"obj": obj, "x": "y"}
+
+
+def test_serialized_prefix_only_decoded_in_params():
+    args = snakemake_args(
+        [
+            "--wildcards",
+            "labelled",
+            "w",
+            "b64:MTIz",
+            "--params",
+            "labelled",
+            "p",
+            "b64:MTIz",
+        ]
+    )
+    assert args.wildcards == {"w": "b64:MTIz"}
+    assert args.params == {"p": 123}
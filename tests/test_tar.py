@@ -1,8 +1,14 @@
 from __future__ import absolute_import
 
+import io
+import os
+import shutil
 import subprocess as sp
 import tarfile
 from pathlib import Path
+from typing import Optional, Tuple
+
+import pytest
 
 from snakeboost import tar
 
@@ -18,6 +24,164 @@ def test_output(tmp_path: Path):
         shell=True,
         capture_output=True,
     )
-    with tarfile.open(tmp_path / "venv.tar.gz", "r:gz") as tf:
-        assert len(tf.getmembers()) == 706
+    with tarfile.open(tmp_path / "venv.tar.gz", "r|gz") as tf:
+        assert sum(1 for _ in tf) == 706
+
+
+def _make_tarball(path: Path, contents: str):
+    # Fixed member metadata, so tarballs with contents of the same length and
+    # letters compress to the same size
+    data = contents.encode()
+    info = tarfile.TarInfo("data.txt")
+    info.size = len(data)
+    info.mode = 0o644
+    with tarfile.open(path, "w:gz") as tf:
+        tf.addfile(info, io.BytesIO(data))
+
+
+def _run(script: str):
+    return sp.run(
+        ["bash", "-c", "set -euo pipefail\n" + script],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+
+
+def test_packed_output_is_readable(tmp_path: Path):
+    tarball = tmp_path / "data.tar.gz"
+    script = tar.Tar(tmp_path / "root", outputs=["{output}"])(
+        "echo packed > {output}/data.txt"
+    ).format(output=tarball)
+    result = _run(script)
+    assert result.returncode == 0, result.stderr
+
+    # Packed with 1MiB records, which must still stream like any other archive
+    with tarfile.open(tarball, "r|*") as tf:
+        members = {
+            member.name: tf.extractfile(member).read()
+            for member in tf
+            if member.isfile()
+        }
+    assert members == {"./data.txt": b"packed\n"}
+
+
+def test_input_mount_is_reused(tmp_path: Path):
+    tarball = tmp_path / "data.tar.gz"
+    _make_tarball(tarball, "first")
+    script = tar.Tar(tmp_path / "root", inputs=["{input}"])(
+        "cat {input}/data.txt"
+    ).format(input=tarball)
+
+    first = _run(script)
+    assert first.returncode == 0, first.stderr
+    assert "Extracting" in first.stdout
+    assert first.stdout.endswith("first")
+
+    second = _run(script)
+    assert second.returncode == 0, second.stderr
+    assert "Extracting" not in second.stdout
+    assert second.stdout.endswith("first")
+
+
+def test_replaced_input_is_extracted_again(tmp_path: Path):
+    tarball = tmp_path / "data.tar.gz"
+    _make_tarball(tarball, "first")
+    script = tar.Tar(tmp_path / "root", inputs=["{input}"])(
+        "cat {input}/data.txt"
+    ).format(input=tarball)
+    assert _run(script).returncode == 0
+
+    # Swap in a tarball of the same size with the same mtime, straight away, so only
+    # the inode tells them apart
+    replacement = tmp_path / "replacement" / "data.tar.gz"
+    replacement.parent.mkdir()
+    _make_tarball(replacement, "tsrif")
+    original = tarball.stat()
+    assert replacement.stat().st_size == original.st_size
+    os.utime(replacement, ns=(original.st_atime_ns, original.st_mtime_ns))
+    os.replace(replacement, tarball)
+
+    result = _run(script)
+    assert result.returncode == 0, result.stderr
+    assert "Extracting" in result.stdout
+    assert result.stdout.endswith("tsrif")
+
+
+def test_parallel_output_failure_fails_script(tmp_path: Path):
+    good = tmp_path / "good.tar.gz"
+    # tar can't write into a directory that doesn't exist
+    bad = tmp_path / "missing" / "bad.tar.gz"
+    script = tar.Tar(tmp_path / "root", outputs=["{bad}", "{good}"], parallel=True)(
+        "touch {bad}/a {good}/b"
+    ).format(bad=bad, good=good)
+
+    result = _run(script)
+    assert result.returncode != 0
+    assert good.exists()
+    assert not bad.exists()
+
+
+@pytest.mark.skipif(shutil.which("zstd") is None, reason="zstd is not installed")
+def test_zstd_output_round_trip(tmp_path: Path):
+    tarball = tmp_path / "data.tar.zst"
+    zstd_tar = tar.Tar(tmp_path / "root", compression="zst")
+    packed = _run(
+        zstd_tar.using(outputs=["{output}"])("echo zstd > {output}/data.txt").format(
+            output=tarball
+        )
+    )
+    assert packed.returncode == 0, packed.stderr
+    listed = sp.run(
+        ["tar", "-tf", tarball, "-I", "zstd"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert listed.stdout.split() == ["./", "./data.txt"]
+
+    # Read it back through a fresh mount
+    shutil.rmtree(tmp_path / "root")
+    result = _run(
+        zstd_tar.using(inputs=["{input}"])("cat {input}/data.txt").format(input=tarball)
+    )
+    assert result.returncode == 0, result.stderr
+    assert "Extracting" in result.stdout
+    assert result.stdout.endswith("zstd\n")
+
+
+def test_unknown_compression_is_rejected(tmp_path: Path):
+    with pytest.raises(ValueError):
+        tar.Tar(tmp_path, compression="bz2")
+
+
+@pytest.mark.parametrize(
+    ("compression", "level", "expected"),
+    (
+        ("gz", 3, ("-p ${{SNAKEBOOST_PIGZ_THREADS:-$(nproc)}} -3", "echo gzip -3")),
+        ("gz", None, ('-p ${{SNAKEBOOST_PIGZ_THREADS:-$(nproc)}}"', "echo gzip)")),
+        ("zst", 19, ("zstd -T0 -19",)),
+        ("zst", None, ('zstd -T0"',)),
+    ),
+)
+def test_compress_level(
+    compression: str, level: Optional[int], expected: Tuple[str, ...], tmp_path: Path
+):
+    script = tar.Tar(
+        tmp_path, outputs=["{output}"], compression=compression, compress_level=level
+    )("touch {output}/a")
+    programs = [
+        line.split(" -I ")[1].split(" -C ")[0]
+        for line in script.splitlines()
+        if " -I " in line
+    ]
+    assert programs
+    for program in programs:
+        assert all(part in program for part in expected), program
+
 
+def test_using_threads(tmp_path: Path):
+    threaded = tar.Tar(tmp_path).using(threads=4)
+    assert threaded.threads == 4
+    assert threaded.using().threads == 4
+    assert threaded.using(threads=None).threads is None
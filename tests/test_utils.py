@@ -0,0 +1,73 @@
+from __future__ import absolute_import
+
+import itertools as it
+
+import pytest
+
+from snakeboost.utils import within_quotes
+
+
+@pytest.mark.parametrize(
+    ("text", "curr", "result"),
+    (
+        ("", 0, 0),
+        ("echo hi", 0, 0),
+        ("echo hi", 1, 1),
+        ("echo hi", -1, -1),
+        ("echo 'hi", 0, 1),
+        ("echo 'hi'", 0, 0),
+        ('echo "hi', 0, -1),
+        ('echo "hi"', 0, 0),
+        # Single quotes are ignored within double quotes, and vice versa
+        ('echo "it\'s"', 0, 0),
+        ("echo 'say \"hi\"'", 0, 0),
+        ("echo 'say \"hi", 0, 1),
+        # Escaped quotes don't open quotes
+        ('echo \\"hi', 0, 0),
+        ("echo \\'hi", 0, 0),
+        # Escaped double quotes don't close double quotes...
+        ('"a\\"b', 0, -1),
+        ('\\"', -1, -1),
+        # ...but single quotes can't be escaped within single quotes
+        ("'a\\'", 0, 0),
+        ("'a\\'b'", 0, 1),
+        ("\\'", 1, 0),
+        # Starting from within quotes
+        ("hi'", 1, 0),
+        ('hi"', 1, 1),
+        ('hi"', -1, 0),
+        ("hi'", -1, -1),
+        ("\"'\"'", 0, 1),
+    ),
+)
+def test_within_quotes(text: str, curr: int, result: int):
+    assert within_quotes(text, curr) == result
+
+
+def _reference_within_quotes(text: str, curr: int = 0):
+    """Plain character by character scan, for checking within_quotes against"""
+    for i, char in enumerate(text):
+        escaped = i > 0 and text[i - 1] == "\\"
+        if curr == 0:
+            if char == '"' and not escaped:
+                curr = -1
+            elif char == "'" and not escaped:
+                curr = 1
+        elif curr == -1:
+            if char == '"' and not escaped:
+                curr = 0
+        elif char == "'":
+            curr = 0
+    return curr
+
+
+@pytest.mark.parametrize("curr", (-1, 0, 1))
+def test_within_quotes_matches_reference(curr: int):
+    # Every string of up to 6 characters covers each quote transition, escaped and
+    # not, from every state
+    for length in range(7):
+        for chars in it.product("a'\"\\", repeat=length):
+            text = "".join(chars)
+            assert within_quotes(text, curr) == _reference_within_quotes(
+                text, curr
+            ), text